@@ -6,10 +6,15 @@ import logging
 from dataclasses import dataclass
 from datetime import date
 from pathlib import Path
-from typing import Dict, Iterable, List, Tuple
+from typing import Dict, Iterable, List
 import uuid
 import re
 
+try:
+    import orjson  # optional: faster encoder that writes UTF-8 bytes directly
+except ImportError:
+    orjson = None
+
 # Converts a CGATS Color Data file to JSON format
 # JSON file will be used to load data into Postgres database
 #
@@ -23,131 +28,183 @@ import re
 #   Eliminated descriptive data that is included in the template table in the database
 
 CGATS_KV_RE = re.compile(r"^\s*([A-Za-z0-9_./-]+)\s*[:=]\s*(.*?)\s*$")
-COMMENT_RE = re.compile(r"^\s*(?:#|//|;|\*)")
-WS_ONLY_RE = re.compile(r"^\s*$")
+_COMMENT_PREFIXES = ("#", "//", ";", "*")
+# 1 MiB I/O buffers: fewer read()/write() calls on large files and network shares
+_IO_BUFFER_SIZE = 1 << 20
+# Upper bound on rows pre-allocated from the NUMBER_OF_SETS header. The header
+# is not trusted: a bad value only costs list growth, never a huge allocation.
+_MAX_PRESIZED_ROWS = 100_000
 
 
 @dataclass(frozen=True)
 class ParseResult:
     descriptive: Dict[str, str]
     keys: List[str]
-    rows: List[Dict[str, str]]
-
-
-def iter_nonempty_lines(text: Iterable[str]) -> Iterable[str]:
-    for raw in text:
-        line = raw.rstrip("\r\n")
-        if not line:
-            yield ""
-        else:
-            yield line
-
-
-def parse_descriptive_and_formats(lines: Iterable[str], logger: logging.Logger) -> Tuple[Dict[str, str], List[str], List[str]]:
+    # Row dicts, or plain value lists in key order when parsed columnar
+    rows: List[Dict[str, str]] | List[List[str]]
+
+
+def parse_cgats_stream(
+    fh: Iterable[str], measurement_uuid: str, logger: logging.Logger, columnar: bool = False
+) -> ParseResult:
+    # Single pass over header, data format and data rows. Each row gets
+    # MEASUREMENT_ID as it is built, so the rows are ready for output.
+    # With columnar=True rows stay as value lists in key order instead
+    # (the ID is stored once by to_columnar_json).
+    # state: 0 = header, 1 = inside BEGIN_DATA_FORMAT, 2 = inside BEGIN_DATA
     descriptive: Dict[str, str] = {}
     keys: List[str] = []
-    buffer_after_begin_data: List[str] = []
-
-    in_df = False
-    in_data = False
-
-    for line in iter_nonempty_lines(lines):
+    rows: List = []
+
+    # Bound methods, looked up once per call
+    _kv_match = CGATS_KV_RE.match
+    append = rows.append
+    # Checked once so disabled debug logging costs no call per ignored line
+    _dbg = logger.isEnabledFor(logging.DEBUG)
+
+    # Fixed once the first data row is seen (keys may be inferred from it)
+    keys_len = -1
+    pad: List[str] = []
+    # rows is pre-sized from NUMBER_OF_SETS (capped) and filled by index;
+    # rows beyond that are appended
+    nsets = 0
+    n_rows = 0
+    # Column-count mismatches are summarised once after the loop
+    short_rows = 0
+    long_rows = 0
+    first_bad: str | None = None
+
+    state = 0
+    for line in fh:
         u = line.strip()
 
-        if not in_df and not in_data and (COMMENT_RE.match(u) or WS_ONLY_RE.match(u)):
-            continue
-
-        if not in_df and not in_data:
-            if u.upper().startswith("BEGIN_DATA_FORMAT"):
-                in_df = True
+        # Data rows are the bulk of the file, so test for them first
+        if state == 2:
+            if not u:
                 continue
-            if u.upper().startswith("BEGIN_DATA"):
-                in_data = True
+            # END_DATA is the only letter-led sentinel here; numeric rows skip the upper()
+            if u[0] in "Ee" and u.upper().startswith("END_DATA"):
+                break
+            if u.startswith(_COMMENT_PREFIXES):
                 continue
 
-            m = CGATS_KV_RE.match(line)
-            if m:
-                k, v = m.group(1), m.group(2)
-                descriptive[k.strip().upper()] = v.strip()
+            if keys_len < 0:
+                if not keys:
+                    keys = [f"C{i+1}" for i in range(len(u.split()))]
+                    if _dbg:
+                        logger.debug("No keys found in BEGIN_DATA_FORMAT; inferred %d columns: %s", len(keys), keys)
+                keys_len = len(keys)
+                pad = [""] * keys_len
+                try:
+                    nsets = min(max(int(descriptive.get("NUMBER_OF_SETS", 0)), 0), _MAX_PRESIZED_ROWS)
+                except ValueError:
+                    nsets = 0
+                rows.extend([None] * nsets)
+
+            # maxsplit stops tokenizing once a row is known to be too long;
+            # zip() then drops the unsplit remainder.
+            cols = u.split(None, keys_len)
+            n = len(cols)
+            if n != keys_len:
+                if n < keys_len:
+                    short_rows += 1
+                    cols += pad[: keys_len - n]
+                else:
+                    long_rows += 1
+                if first_bad is None:
+                    first_bad = u
+
+            if columnar:
+                row = cols[:keys_len] if n > keys_len else cols
             else:
-                logger.debug("Ignoring header line: %r", line)
+                row = dict(zip(keys, cols), MEASUREMENT_ID=measurement_uuid)
+            if n_rows < nsets:
+                rows[n_rows] = row
+            else:
+                append(row)
+            n_rows += 1
             continue
 
-        if in_df and not in_data:
-            if u.upper().startswith("END_DATA_FORMAT"):
-                in_df = False
+        # Header and data-format lines: upper-case once for the marker checks
+        up = u.upper()
+
+        if state == 1:
+            if up.startswith("END_DATA_FORMAT"):
+                state = 0
                 continue
-            if u.upper().startswith("BEGIN_DATA"):
-                in_df = False
-                in_data = True
+            if up.startswith("BEGIN_DATA"):
+                state = 2
                 continue
 
-            if u and not COMMENT_RE.match(u):
+            if u and not u.startswith(_COMMENT_PREFIXES):
                 parts = u.split()
                 keys.extend([p.strip().upper() for p in parts if p.strip()])
             continue
 
-        if in_data:
-            buffer_after_begin_data.append(line)
-
-    return descriptive, keys, buffer_after_begin_data
-
-
-def parse_rows(after_begin_data_lines: List[str], keys: List[str], logger: logging.Logger) -> List[Dict[str, str]]:
-    rows: List[Dict[str, str]] = []
-    for line in after_begin_data_lines:
-        u = line.strip()
-        if not u:
+        if not u or u.startswith(_COMMENT_PREFIXES):
             continue
-        up = u.upper()
-        if up.startswith("END_DATA"):
-            break
-        if COMMENT_RE.match(u):
+        if up.startswith("BEGIN_DATA_FORMAT"):
+            state = 1
+            continue
+        if up.startswith("BEGIN_DATA"):
+            state = 2
             continue
 
-        cols = u.split()
-        if len(cols) != len(keys):
-            logger.warning("Row has %d cols but %d keys. Row: %r", len(cols), len(keys), u)
-        if len(cols) < len(keys):
-            cols.extend([""] * (len(keys) - len(cols)))
-        elif len(cols) > len(keys):
-            cols = cols[: len(keys)]
-
-        row = {k: v for k, v in zip(keys, cols)}
-        rows.append(row)
-    return rows
-
-
-def parse_cgats_text(text: str, logger: logging.Logger) -> ParseResult:
-    descriptive, keys, after_begin_data = parse_descriptive_and_formats(text.splitlines(), logger)
-
-    if not keys:
-        logger.debug("No keys found in BEGIN_DATA_FORMAT; attempting to infer from first data line.")
-        for line in after_begin_data:
-            s = line.strip()
-            if s and not COMMENT_RE.match(s) and not s.upper().startswith("END_DATA"):
-                n = len(s.split())
-                keys = [f"C{{i+1}}" for i in range(n)]
-                logger.debug("Inferred %d columns: %s", n, keys)
-                break
-
-    rows = parse_rows(after_begin_data, keys, logger)
+        m = _kv_match(u)
+        if m:
+            # The pattern already excludes surrounding whitespace from both groups
+            k, v = m.groups()
+            descriptive[k.upper()] = v
+        elif _dbg:
+            logger.debug("Ignoring header line: %r", u)
+
+    # Drop unused slots if the file had fewer rows than NUMBER_OF_SETS
+    del rows[n_rows:]
+
+    if short_rows or long_rows:
+        logger.warning(
+            "%d short, %d long rows vs %d keys (padded/truncated). First: %r",
+            short_rows, long_rows, keys_len, first_bad,
+        )
     return ParseResult(descriptive=descriptive, keys=keys, rows=rows)
 
 
-def to_json(descriptive: Dict[str, str], rows: List[Dict[str, str]], measurement_uuid: str) -> Dict[str, object]:
-    enriched_rows: List[Dict[str, str]] = []
-    for r in rows:
-        rr = dict(r)
-        rr["MEASUREMENT_ID"] = measurement_uuid
-        enriched_rows.append(rr)
+def to_json(descriptive: Dict[str, str], rows: List[Dict[str, str]]) -> Dict[str, object]:
+    return {
+        "descriptive_data": descriptive,
+        "measurement_data": rows,
+    }
 
+
+def to_columnar_json(
+    descriptive: Dict[str, str], keys: List[str], rows: List[List[str]], measurement_uuid: str
+) -> Dict[str, object]:
+    # Column names once plus one value list per row, instead of repeating
+    # every key in every row object
     return {
         "descriptive_data": descriptive,
-        "measurement_data": enriched_rows,
+        "measurement_id": measurement_uuid,
+        "columns": keys,
+        "rows": rows,
     }
 
 
+def write_json(payload: Dict[str, object], output_path: Path, compact: bool) -> None:
+    if orjson is not None:
+        # orjson only supports 2-space indentation, which matches the default
+        option = 0 if compact else orjson.OPT_INDENT_2
+        output_path.write_bytes(orjson.dumps(payload, option=option))
+        return
+
+    # Pretty by default; compact if --compact (no whitespace between items)
+    indent = None if compact else 2
+    separators = (",", ":") if compact else None
+    # The payload is plain dicts/lists/strs, so the encoder's
+    # circular-reference bookkeeping can be skipped.
+    with output_path.open("w", encoding="utf-8", buffering=_IO_BUFFER_SIZE) as fh:
+        json.dump(payload, fh, indent=indent, separators=separators, ensure_ascii=False, check_circular=False)
+
+
 def configure_logging(verbose: bool, log_file: Path | None) -> logging.Logger:
     logger = logging.getLogger("cgats2json")
     logger.setLevel(logging.DEBUG if verbose else logging.INFO)
@@ -179,6 +236,11 @@ def main(argv: List[str] | None = None) -> int:
     ap.add_argument("--log-file", type=Path, default=None, help="Optional log file path")
     ap.add_argument("-v", "--verbose", action="store_true", help="Enable verbose logging")
     ap.add_argument("--compact", action="store_true", help="Output compact JSON instead of pretty-printed")  # NEW
+    ap.add_argument(
+        "--columnar",
+        action="store_true",
+        help="Write measurement data as a column list plus per-row value lists (smaller JSON)",
+    )
 
     args = ap.parse_args(argv)
 
@@ -188,28 +250,29 @@ def main(argv: List[str] | None = None) -> int:
     output_path: Path = args.output if args.output else input_path.with_suffix(".json")
 
     logger.info("Reading CGATS file: %s", input_path)
-    text = input_path.read_text(encoding="utf-8", errors="replace")
 
     measurement_uuid = str(uuid.uuid4())
     logger.info("Generated MEASUREMENT_ID: %s", measurement_uuid)
 
-    result = parse_cgats_text(text, logger=logger)
+    with input_path.open("r", encoding="utf-8", errors="replace", buffering=_IO_BUFFER_SIZE) as fh:
+        result = parse_cgats_stream(fh, measurement_uuid, logger=logger, columnar=args.columnar)
 
-    # Enrich header with defaults
-    result.descriptive.setdefault("MEASUREMENT_ID", measurement_uuid)
-    result.descriptive.setdefault("PARSED_DATE", date.today().isoformat())
-    result.descriptive.setdefault("PROJECT", "NONE")     # NEW default
-    result.descriptive.setdefault("TEMPLATE", "NONE")    # NEW default
+    # Enrich header with defaults; values parsed from the file take precedence
+    defaults = {
+        "MEASUREMENT_ID": measurement_uuid,
+        "PARSED_DATE": date.today().isoformat(),
+        "PROJECT": "NONE",
+        "TEMPLATE": "NONE",
+    }
+    enriched_desc = defaults | result.descriptive
 
-    payload = to_json(result.descriptive, result.rows, measurement_uuid)
+    if args.columnar:
+        payload = to_columnar_json(enriched_desc, result.keys, result.rows, measurement_uuid)
+    else:
+        payload = to_json(enriched_desc, result.rows)
 
-    # Pretty by default; compact if --
-    indent = None if args.compact else 2
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_text(
-        json.dumps(payload, indent=indent, ensure_ascii=False),
-        encoding="utf-8",
-    )
+    write_json(payload, output_path, compact=args.compact)
     logger.info("Wrote JSON to: %s", output_path)
     return 0
 
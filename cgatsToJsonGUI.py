@@ -8,10 +8,16 @@ import re
 import sys
 import uuid
 from dataclasses import dataclass
+from functools import lru_cache
 from datetime import date, datetime
 from pathlib import Path
 from typing import Dict, Iterable, List, Tuple
 
+try:
+    import orjson  # optional: faster encoder that writes UTF-8 bytes directly
+except ImportError:
+    orjson = None
+
 import tkinter as tk
 from tkinter import ttk
 import tkinter.font as tkfont
@@ -43,8 +49,10 @@ from tkinter import filedialog, messagebox
 # ----------------------------
 
 CGATS_KV_RE = re.compile(r"^\s*([A-Za-z0-9_./-]+)\s*[:=]\s*(.*?)\s*$")
-COMMENT_RE = re.compile(r"^\s*(?:#|//|;|\*)")
-WS_ONLY_RE = re.compile(r"^\s*$")
+_COMMENT_PREFIXES = ("#", "//", ";", "*")
+
+# Line classes returned by _classify
+_TEXT, _BLANK, _COMMENT, _BEGIN_DF, _END_DF, _BEGIN_DATA = range(6)
 
 
 @dataclass(frozen=True)
@@ -63,6 +71,24 @@ def iter_nonempty_lines(text: Iterable[str]) -> Iterable[str]:
             yield line
 
 
+def _classify(u: str) -> int:
+    # u is an already stripped line; str.startswith is used instead of regexes
+    if not u:
+        return _BLANK
+    if u.startswith(_COMMENT_PREFIXES):
+        return _COMMENT
+    if u[0] in "BbEe":
+        # Markers are case-insensitive; only upper-case the prefix that matters
+        up = u[:17].upper()
+        if up.startswith("BEGIN_DATA_FORMAT"):
+            return _BEGIN_DF
+        if up.startswith("END_DATA_FORMAT"):
+            return _END_DF
+        if up.startswith("BEGIN_DATA"):
+            return _BEGIN_DATA
+    return _TEXT
+
+
 def parse_descriptive_and_formats(lines: Iterable[str], logger: logging.Logger) -> Tuple[Dict[str, str], List[str], List[str]]:
     descriptive: Dict[str, str] = {}
     keys: List[str] = []
@@ -71,81 +97,114 @@ def parse_descriptive_and_formats(lines: Iterable[str], logger: logging.Logger)
     in_df = False
     in_data = False
 
-    for line in iter_nonempty_lines(lines):
-        u = line.strip()
+    _kv_match = CGATS_KV_RE.match
+    _dbg = logger.isEnabledFor(logging.DEBUG)
 
-        if not in_df and not in_data and (COMMENT_RE.match(u) or WS_ONLY_RE.match(u)):
+    for line in iter_nonempty_lines(lines):
+        if in_data:
+            buffer_after_begin_data.append(line)
             continue
 
-        if not in_df and not in_data:
-            if u.upper().startswith("BEGIN_DATA_FORMAT"):
+        u = line.strip()
+        kind = _classify(u)
+
+        if not in_df:
+            if kind == _BLANK or kind == _COMMENT:
+                continue
+            if kind == _BEGIN_DF:
                 in_df = True
                 continue
-            if u.upper().startswith("BEGIN_DATA"):
+            if kind == _BEGIN_DATA:
                 in_data = True
                 continue
 
-            m = CGATS_KV_RE.match(line)
+            m = _kv_match(line)
             if m:
                 k, v = m.group(1), m.group(2)
                 descriptive[k.strip().upper()] = v.strip()
-            else:
+            elif _dbg:
                 logger.debug("Ignoring header line: %r", line)
             continue
 
-        if in_df and not in_data:
-            if u.upper().startswith("END_DATA_FORMAT"):
-                in_df = False
-                continue
-            if u.upper().startswith("BEGIN_DATA"):
-                in_df = False
-                in_data = True
-                continue
-
-            if u and not COMMENT_RE.match(u):
-                parts = u.split()
-                keys.extend([p.strip().upper() for p in parts if p.strip()])
+        if kind == _END_DF:
+            in_df = False
+            continue
+        if kind == _BEGIN_DATA or kind == _BEGIN_DF:
+            # Any BEGIN_DATA* marker starts the data block here
+            in_df = False
+            in_data = True
             continue
 
-        if in_data:
-            buffer_after_begin_data.append(line)
+        if kind != _BLANK and kind != _COMMENT:
+            # split() never yields empty or padded parts
+            keys.extend(u.upper().split())
 
     return descriptive, keys, buffer_after_begin_data
 
 
 def parse_rows(after_begin_data_lines: List[str], keys: List[str], logger: logging.Logger) -> List[Dict[str, str]]:
-    rows: List[Dict[str, str]] = []
+    # The buffered line count is an upper bound on rows; unfilled (None)
+    # slots are trimmed at the end
+    rows: List[Dict[str, str] | None] = [None] * len(after_begin_data_lines)
+    n = 0
+    nkeys = len(keys)
+    # Mismatched rows are counted and reported once, not per row
+    short_rows = 0
+    long_rows = 0
+    first_bad: str | None = None
     for line in after_begin_data_lines:
         u = line.strip()
         if not u:
             continue
-        up = u.upper()
-        if up.startswith("END_DATA"):
+        # Upper-case only lines that could be END_DATA, not every data row
+        if u[0] in "Ee" and u.upper().startswith("END_DATA"):
             break
-        if COMMENT_RE.match(u):
+        if u.startswith(_COMMENT_PREFIXES):
             continue
 
-        cols = u.split()
-        if len(cols) != len(keys):
-            logger.warning("Row has %d cols but %d keys. Row: %r", len(cols), len(keys), u)
-        if len(cols) < len(keys):
-            cols.extend([""] * (len(keys) - len(cols)))
-        elif len(cols) > len(keys):
-            cols = cols[: len(keys)]
+        # Stop splitting after nkeys tokens; well-formed rows take the fast path
+        cols = u.split(None, nkeys)
+        if len(cols) == nkeys:
+            rows[n] = dict(zip(keys, cols))
+            n += 1
+            continue
+
+        if first_bad is None:
+            first_bad = u
+        if len(cols) < nkeys:
+            short_rows += 1
+            cols.extend([""] * (nkeys - len(cols)))
+        else:
+            long_rows += 1
+            cols = cols[:nkeys]
+
+        rows[n] = dict(zip(keys, cols))
+        n += 1
 
-        row = {k: v for k, v in zip(keys, cols)}
-        rows.append(row)
+    del rows[n:]
+
+    if short_rows or long_rows:
+        logger.warning(
+            "%d short, %d long rows vs %d keys (padded/truncated). First: %r",
+            short_rows, long_rows, nkeys, first_bad,
+        )
     return rows
 
 
-def parse_cgats_text(text: str, logger: logging.Logger) -> ParseResult:
-    descriptive, keys, after_begin_data = parse_descriptive_and_formats(text.splitlines(), logger)
+def parse_cgats_text(text: str | Iterable[str], logger: logging.Logger) -> ParseResult:
+    # Accepts the whole text or any line iterable (e.g. an open file)
+    if isinstance(text, str):
+        # split("\n") builds one list with no per-line scan for the other
+        # splitlines() separators; a trailing "\r" from CRLF text is removed
+        # by the per-line strip() downstream
+        text = text.split("\n")
+    descriptive, keys, after_begin_data = parse_descriptive_and_formats(text, logger)
 
     if not keys:
         logger.debug("No keys found; attempting to infer from first data line.")
         for line in after_begin_data:
             s = line.strip()
-            if s and not COMMENT_RE.match(s) and not s.upper().startswith("END_DATA"):
+            if s and not s.startswith(_COMMENT_PREFIXES) and not s.upper().startswith("END_DATA"):
                 n = len(s.split())
                 keys = [f"C{i+1}" for i in range(n)]
                 logger.debug("Inferred %d columns: %s", n, keys)
@@ -156,18 +215,38 @@ def parse_cgats_text(text: str, logger: logging.Logger) -> ParseResult:
 
 
 def to_json(descriptive: Dict[str, str], rows: List[Dict[str, str]], measurement_uuid: str) -> Dict[str, object]:
-    enriched_rows: List[Dict[str, str]] = []
+    # Consumes rows: the parser's row dicts are tagged in place rather than copied
     for r in rows:
-        rr = dict(r)
-        rr["MEASUREMENT_ID"] = measurement_uuid
-        enriched_rows.append(rr)
+        r["MEASUREMENT_ID"] = measurement_uuid
 
     return {
         "descriptive_data": descriptive,
-        "measurement_data": enriched_rows,
+        "measurement_data": rows,
     }
 
 
+def _dumps(obj: object, pretty: bool) -> bytes:
+    # UTF-8 JSON bytes; both encoders give identical output
+    if orjson is not None:
+        # orjson only supports 2-space indentation, which matches the default
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+    if pretty:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def write_json(payload: Dict[str, object], output_path: Path, compact: bool) -> None:
+    if orjson is not None:
+        output_path.write_bytes(_dumps(payload, not compact))
+        return
+
+    # Stream straight to the file instead of building one large str first
+    indent = None if compact else 2
+    separators = (",", ":") if compact else None
+    with output_path.open("w", encoding="utf-8") as fh:
+        json.dump(payload, fh, indent=indent, separators=separators, ensure_ascii=False)
+
+
 # ----------------------------
 # Prefs utilities (OS path + plain JSON)
 # ----------------------------
@@ -190,12 +269,17 @@ def load_prefs_json(path: Path) -> dict:
     except Exception:
         return {}
 
-def save_prefs_json(path: Path, prefs: dict) -> None:
+def save_prefs_json(path: Path, prefs: dict) -> bool:
     try:
         path.parent.mkdir(parents=True, exist_ok=True)
-        path.write_text(json.dumps(prefs, ensure_ascii=False, indent=2), encoding="utf-8")
+        # Write a sibling temp file and swap it in, so a crash never leaves half a prefs file
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_bytes(_dumps(prefs, True))
+        os.replace(tmp, path)
+        return True
     except Exception as e:
         print(f"Warning: could not save prefs: {e}", file=sys.stderr)
+        return False
 
 
 # ----------------------------
@@ -203,12 +287,15 @@ def save_prefs_json(path: Path, prefs: dict) -> None:
 # ----------------------------
 
 INVALID_CHARS = r'<>:"/\\|?*'
-RESERVED_BASENAMES = {
+_INVALID_RE = re.compile(f"[{re.escape(INVALID_CHARS)}]")
+RESERVED_BASENAMES = frozenset({
     "CON", "PRN", "AUX", "NUL",
     *{f"COM{i}" for i in range(1, 10)},
     *{f"LPT{i}" for i in range(1, 10)},
-}
+})
 
+# Called on every keystroke, resize and process(); results are immutable tuples
+@lru_cache(maxsize=256)
 def sanitize_filename(name: str) -> tuple[str, bool, str]:
     original = name
     modified = False
@@ -219,9 +306,8 @@ def sanitize_filename(name: str) -> tuple[str, bool, str]:
         reason_parts.append("empty filename")
 
     basename = name
-    invalid_re = re.compile(f"[{re.escape(INVALID_CHARS)}]")
-    if invalid_re.search(basename):
-        basename = invalid_re.sub("_", basename)
+    if _INVALID_RE.search(basename):
+        basename = _INVALID_RE.sub("_", basename)
         modified = True
         reason_parts.append("removed invalid characters")
 
@@ -244,8 +330,8 @@ def sanitize_filename(name: str) -> tuple[str, bool, str]:
         final_stem = basename
         final_ext = ".json"
 
-    check_stem = final_stem.upper()
-    if check_stem in RESERVED_BASENAMES:
+    # Reserved names are at most 4 characters; skip upper() for anything longer
+    if len(final_stem) <= 4 and final_stem.upper() in RESERVED_BASENAMES:
         final_stem = final_stem + "_1"
         modified = True
         reason_parts.append("avoided reserved name")
@@ -260,11 +346,18 @@ def next_available_path(path: Path) -> Path:
     parent = path.parent
     stem = path.stem
     suffix = path.suffix
+    # One directory listing instead of a stat() per candidate name;
+    # casefolded so case-insensitive filesystems are handled too
+    try:
+        with os.scandir(parent) as it:
+            taken = {entry.name.casefold() for entry in it}
+    except OSError:
+        taken = set()
     i = 1
     while True:
-        candidate = parent / f"{stem}_{i}{suffix}"
-        if not candidate.exists():
-            return candidate
+        name = f"{stem}_{i}{suffix}"
+        if name.casefold() not in taken:
+            return parent / name
         i += 1
 
 
@@ -293,6 +386,7 @@ class App(tk.Tk):
         self.default_output_name: str = default_output_name
 
         self._prefs_loaded = tmp_prefs  # store for initial UI values
+        self._prefs_saved = dict(tmp_prefs)  # last state on disk, to skip no-op saves
 
         # Logger
         self.logger = logging.getLogger("gui")
@@ -388,20 +482,33 @@ class App(tk.Tk):
         self.eff_label.configure(style="Note.TLabel")
         self.eff_label.pack(side="left", padx=8, fill="x", expand=True)
 
-        def update_wraplength(event=None):
+        self._resize_after = None
+        self._wraplengths = {}
+
+        def update_wraplength():
+            self._resize_after = None
             pad = 24
             for row, label in [(in_row, self.input_label), (folder_row, self.folder_label), (eff_row, self.eff_label)]:
                 try:
                     w = max(100, row.winfo_width() - pad)
-                    label.configure(wraplength=w)
+                    # Skip the configure (and re-layout) when nothing moved
+                    if self._wraplengths.get(label) != w:
+                        label.configure(wraplength=w)
+                        self._wraplengths[label] = w
                 except Exception:
                     pass
             self.eff_path_var.set(str(self.output_path))
 
-        in_row.bind("<Configure>", update_wraplength)
-        folder_row.bind("<Configure>", update_wraplength)
-        eff_row.bind("<Configure>", update_wraplength)
-        self.bind("<Configure>", update_wraplength)
+        def schedule_wraplength(event=None):
+            # A resize drag fires <Configure> many times; coalesce into one update
+            if self._resize_after is not None:
+                self.after_cancel(self._resize_after)
+            self._resize_after = self.after(50, update_wraplength)
+
+        in_row.bind("<Configure>", schedule_wraplength)
+        folder_row.bind("<Configure>", schedule_wraplength)
+        eff_row.bind("<Configure>", schedule_wraplength)
+        self.bind("<Configure>", schedule_wraplength)
 
         # Options
         opts = ttk.LabelFrame(outer, text="Options", padding=12)
@@ -535,18 +642,22 @@ class App(tk.Tk):
         except Exception:
             pass
 
-        # Read & parse
+        logger = logging.getLogger("cgats2json.gui")
+        logger.setLevel(logging.INFO)
+
+        # Read & parse, streaming lines from the file
         try:
-            text = self.input_path.read_text(encoding="utf-8", errors="replace")
+            fh = self.input_path.open("r", encoding="utf-8", errors="replace")
         except Exception as e:
             messagebox.showerror("Read error", f"Could not read input file:\n{e}")
             return
 
-        logger = logging.getLogger("cgats2json.gui")
-        logger.setLevel(logging.INFO)
-
         try:
-            result = parse_cgats_text(text, logger=logger)
+            with fh:
+                result = parse_cgats_text(fh, logger=logger)
+        except OSError as e:
+            messagebox.showerror("Read error", f"Could not read input file:\n{e}")
+            return
         except Exception as e:
             messagebox.showerror("Parse error", f"Failed to parse CGATS file:\n{e}")
             return
@@ -582,39 +693,20 @@ class App(tk.Tk):
             # Keep parsed DESCRIPTION if present; otherwise default to NONE
             desc.setdefault("DESCRIPTION", "NONE")
         payload = to_json(desc, result.rows, measurement_uuid)
-        indent = None if self.compact_var.get() else 2
 
         try:
             target_path.parent.mkdir(parents=True, exist_ok=True)
-            target_path.write_text(json.dumps(payload, indent=indent, ensure_ascii=False), encoding="utf-8")
+            write_json(payload, target_path, bool(self.compact_var.get()))
         except Exception as e:
             messagebox.showerror("Write error", f"Could not write output file:\n{e}")
             return
 
         # Save prefs after successful process
-        prefs = {
-            "project": self.project_var.get(),
-            "template": self.template_var.get(),
-            "measurement_date": self.mdate_var.get(),
-            "last_input_path": str(self.input_path) if self.input_path else "",
-            "output_folder": str(self.output_folder),
-            "output_filename": self.output_filename,
-            "compact": bool(self.compact_var.get()),
-        }
-        # Remember Description handling (new)
-        prefs["remember_description"] = bool(self.remember_desc_var.get())
-        if prefs["remember_description"]:
-            prefs["description"] = self.desc_var.get()
-        else:
-            # ensure we don't persist a stale description
-            if "description" in prefs:
-                del prefs["description"]
-        save_prefs_json(self.prefs_path, prefs)
+        self._save_prefs()
 
         messagebox.showinfo("Done", f"Wrote JSON to:\n{target_path}")
 
-    def _on_close(self):
-        # Attempt to save current UI state as prefs on exit (best-effort)
+    def _save_prefs(self):
         prefs = {
             "project": self.project_var.get(),
             "template": self.template_var.get(),
@@ -630,7 +722,13 @@ class App(tk.Tk):
             prefs["description"] = self.desc_var.get()
         else:
             prefs.pop("description", None)
-        save_prefs_json(self.prefs_path, prefs)
+        # Only touch the file when something actually changed
+        if prefs != self._prefs_saved and save_prefs_json(self.prefs_path, prefs):
+            self._prefs_saved = prefs
+
+    def _on_close(self):
+        # Attempt to save current UI state as prefs on exit (best-effort)
+        self._save_prefs()
         self.destroy()
 
 